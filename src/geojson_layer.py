@@ -1,16 +1,83 @@
 import json
 import math
+import queue
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageDraw
 from layers import Layer
+from tiles import Tile, show_tile, hide_tile
+from utils.files import source_mtime
+
+# Size in pixels of each rasterized tile.
+RENDER_TILE_SIZE = 256
+# Size in blocks of each cell in the feature spatial index.
+INDEX_CELL_SIZE = 256
+# Interval between checks for tiles finished by the render thread.
+RENDER_POLL_MS = 50
+POINT_RADIUS = 5
+
+class RenderedTile(Tile):
+    """
+    A tile rasterized from vector features. Its size is in world units, so it
+    is scaled and drawn exactly like a RasterTileSource tile.
+    """
+    def __init__(self, image, game_x, game_z, world_size):
+        super().__init__(None, 0, 0, game_x, game_z, world_size, world_size)
+        self._image = image
 
 class GeoJSONLayer(Layer):
-    def __init__(self, geojson_file, name="GeoJSON Layer", project=None):
+    def __init__(self, geojson_file, name="GeoJSON Layer", project=None,
+                 rasterize=False, vector_zoom=2.0, max_cached_tiles=256, lazy_load=False):
         super().__init__(name, project)
         self.geojson_file = geojson_file
-        self.geojson_data = None
+        self._geojson_data = None
+        self._load_lock = threading.Lock()
+        self._index_lock = threading.Lock()
         self.canvas_items = []
-        self.load_geojson()
+        # When rasterize is set, the layer is drawn from image tiles rendered on
+        # a background thread below vector_zoom, and as vector items above it.
+        self.rasterize = rasterize
+        self.vector_zoom = vector_zoom
+        self.max_cached_tiles = max_cached_tiles
+        self.feature_bounds = None
+        self.spatial_index = None
+        # Modification time of the file the features and index were read from.
+        self.source_mtime = None
+        self._render_cache = OrderedDict()
+        self._render_jobs = queue.Queue()
+        self._render_results = queue.Queue()
+        self._render_pending = set()
+        self._render_lock = threading.Lock()
+        self._render_thread = None
+        self._render_level = None
+        self._poll_id = None
+        self._canvas = None  # Canvas the rendered tiles were last drawn on
+        # With lazy_load the file is only parsed when its features are first
+        # needed, e.g. when the spatial index comes from a project bundle.
+        if not lazy_load:
+            self.load_geojson()
+
+    @property
+    def geojson_data(self):
+        if self._geojson_data is None:
+            # The render thread may ask for the data at the same time as the UI.
+            with self._load_lock:
+                if self._geojson_data is None:
+                    self.load_geojson()
+        return self._geojson_data
+
+    @geojson_data.setter
+    def geojson_data(self, value):
+        self._geojson_data = value
         
     def load_geojson(self):
+        mtime = source_mtime(self.geojson_file)
+        if self.spatial_index is not None and mtime != self.source_mtime:
+            # A restored index no longer matches the file; rebuild it from the
+            # features about to be read.
+            self.spatial_index = None
+            self.feature_bounds = None
+        self.source_mtime = mtime
         try:
             with open(self.geojson_file, 'r') as f:
                 content = f.read().strip()
@@ -27,31 +94,55 @@ class GeoJSONLayer(Layer):
         for item_id in self.canvas_items:
             canvas.delete(item_id)
         self.canvas_items = []
-        
+
+        if self.rasterize:
+            # Convert the visible region to world coordinates.
+            world_left = (view_left - offset_x) / zoom + self.project.min_x
+            world_top = (view_top - offset_y) / zoom + self.project.min_z
+            world_right = (view_right - offset_x) / zoom + self.project.min_x
+            world_bottom = (view_bottom - offset_y) / zoom + self.project.min_z
+            if zoom < self.vector_zoom:
+                # Features are only read by the render thread here, so a lazily
+                # loaded file is parsed off the UI thread.
+                self._draw_rendered_tiles(canvas, world_left, world_top, world_right, world_bottom,
+                                          zoom, offset_x, offset_y)
+                return
+
         if not self.geojson_data:
             return
+
+        if self.rasterize:
+            # At high zoom only a few features are visible, so draw those directly.
+            self._hide_rendered_tiles(canvas)
+            features = self.geojson_data.get('features', [])
+            for index in self.query_features(world_left, world_top, world_right, world_bottom):
+                self._draw_feature(canvas, features[index], zoom, offset_x, offset_y)
+            return
             
         # Process features
         for feature in self.geojson_data.get('features', []):
-            geometry = feature.get('geometry', {})
-            geometry_type = geometry.get('type')
-            coordinates = geometry.get('coordinates', [])
-            
-            if geometry_type == 'Point':
-                self._draw_point(canvas, coordinates, zoom, offset_x, offset_y)
-            elif geometry_type == 'LineString':
-                self._draw_linestring(canvas, coordinates, zoom, offset_x, offset_y)
-            elif geometry_type == 'Polygon':
-                self._draw_polygon(canvas, coordinates, zoom, offset_x, offset_y)
-            elif geometry_type == 'MultiPoint':
-                for point in coordinates:
-                    self._draw_point(canvas, point, zoom, offset_x, offset_y)
-            elif geometry_type == 'MultiLineString':
-                for line in coordinates:
-                    self._draw_linestring(canvas, line, zoom, offset_x, offset_y)
-            elif geometry_type == 'MultiPolygon':
-                for polygon in coordinates:
-                    self._draw_polygon(canvas, polygon, zoom, offset_x, offset_y)
+            self._draw_feature(canvas, feature, zoom, offset_x, offset_y)
+
+    def _draw_feature(self, canvas, feature, zoom, offset_x, offset_y):
+        geometry = feature.get('geometry', {})
+        geometry_type = geometry.get('type')
+        coordinates = geometry.get('coordinates', [])
+        
+        if geometry_type == 'Point':
+            self._draw_point(canvas, coordinates, zoom, offset_x, offset_y)
+        elif geometry_type == 'LineString':
+            self._draw_linestring(canvas, coordinates, zoom, offset_x, offset_y)
+        elif geometry_type == 'Polygon':
+            self._draw_polygon(canvas, coordinates, zoom, offset_x, offset_y)
+        elif geometry_type == 'MultiPoint':
+            for point in coordinates:
+                self._draw_point(canvas, point, zoom, offset_x, offset_y)
+        elif geometry_type == 'MultiLineString':
+            for line in coordinates:
+                self._draw_linestring(canvas, line, zoom, offset_x, offset_y)
+        elif geometry_type == 'MultiPolygon':
+            for polygon in coordinates:
+                self._draw_polygon(canvas, polygon, zoom, offset_x, offset_y)
     
     def _draw_point(self, canvas, coordinates, zoom, offset_x, offset_y):
         x, z = coordinates
@@ -106,4 +197,259 @@ class GeoJSONLayer(Layer):
                 
                 if hole_points:
                     hole_id = canvas.create_polygon(hole_points, outline='green', fill='', width=2)
-                    self.canvas_items.append(hole_id)
\ No newline at end of file
+                    self.canvas_items.append(hole_id)
+
+    # Spatial index
+
+    def build_spatial_index(self):
+        """
+        Compute the bounds of every feature and bucket them into a uniform grid
+        of INDEX_CELL_SIZE cells so visible features can be found without
+        scanning the whole collection.
+        """
+        feature_bounds = []
+        spatial_index = {}
+        for index, feature in enumerate(self.geojson_data.get('features', [])):
+            geometry = feature.get('geometry') or {}
+            bounds = _coordinate_bounds(geometry.get('coordinates', []))
+            feature_bounds.append(bounds)
+            if bounds is None:
+                continue
+            min_x, min_z, max_x, max_z = bounds
+            for cell_x in range(int(min_x // INDEX_CELL_SIZE), int(max_x // INDEX_CELL_SIZE) + 1):
+                for cell_z in range(int(min_z // INDEX_CELL_SIZE), int(max_z // INDEX_CELL_SIZE) + 1):
+                    spatial_index.setdefault((cell_x, cell_z), []).append(index)
+        # Publish the index only once complete, as other threads test
+        # spatial_index to see whether it is ready.
+        self.feature_bounds = feature_bounds
+        self.spatial_index = spatial_index
+
+    def _ensure_spatial_index(self):
+        if self.spatial_index is None:
+            with self._index_lock:
+                if self.spatial_index is None:
+                    self.build_spatial_index()
+
+    def query_features(self, min_x, min_z, max_x, max_z):
+        """
+        Return the indexes, in draw order, of features whose bounds intersect
+        the given world rectangle.
+        """
+        self._ensure_spatial_index()
+        found = set()
+        for cell_x in range(int(min_x // INDEX_CELL_SIZE), int(max_x // INDEX_CELL_SIZE) + 1):
+            for cell_z in range(int(min_z // INDEX_CELL_SIZE), int(max_z // INDEX_CELL_SIZE) + 1):
+                for index in self.spatial_index.get((cell_x, cell_z), ()):
+                    if index in found:
+                        continue
+                    f_min_x, f_min_z, f_max_x, f_max_z = self.feature_bounds[index]
+                    if f_min_x <= max_x and f_max_x >= min_x and f_min_z <= max_z and f_max_z >= min_z:
+                        found.add(index)
+        return sorted(found)
+
+    # Rasterized rendering
+
+    def _draw_rendered_tiles(self, canvas, world_left, world_top, world_right, world_bottom,
+                             zoom, offset_x, offset_y):
+        # Render at the power-of-two scale at or above the current zoom, so each
+        # tile is only ever scaled down by up to half when drawn.
+        level = math.ceil(math.log2(zoom))
+        scale = 2.0 ** level
+        world_size = RENDER_TILE_SIZE / scale
+        self._render_level = level
+
+        visible = set()
+        for tile_x in range(math.floor(world_left / world_size), math.floor(world_right / world_size) + 1):
+            for tile_z in range(math.floor(world_top / world_size), math.floor(world_bottom / world_size) + 1):
+                key = (level, tile_x, tile_z)
+                visible.add(key)
+                if key not in self._render_cache:
+                    self._request_tile(key)
+                    continue
+                self._render_cache.move_to_end(key)
+                tile = self._render_cache[key]
+                if tile is None:
+                    # Nothing to draw in this tile.
+                    continue
+                canvas_x = (tile.game_x - self.project.min_x) * zoom + offset_x
+                canvas_y = (tile.game_z - self.project.min_z) * zoom + offset_y
+                show_tile(canvas, tile, canvas_x, canvas_y, zoom)
+
+        for key, tile in self._render_cache.items():
+            if key not in visible and tile is not None:
+                hide_tile(canvas, tile)
+
+        self._canvas = canvas
+        if self._render_pending and self._poll_id is None:
+            self._poll_id = canvas.after(RENDER_POLL_MS, self._poll_rendered_tiles, canvas)
+
+    def _hide_rendered_tiles(self, canvas):
+        for tile in self._render_cache.values():
+            if tile is not None:
+                hide_tile(canvas, tile)
+
+    def _request_tile(self, key):
+        with self._render_lock:
+            if key in self._render_pending:
+                return
+            self._render_pending.add(key)
+        if self._render_thread is None:
+            self._render_thread = threading.Thread(target=self._render_worker, daemon=True)
+            self._render_thread.start()
+        self._render_jobs.put(key)
+
+    def _poll_rendered_tiles(self, canvas):
+        """
+        Move finished tiles from the render thread into the cache on the UI
+        thread and ask the viewer to redraw.
+        """
+        self._poll_id = None
+        self._canvas = None  # Canvas the rendered tiles were last drawn on
+        # Check for outstanding work before draining, so a tile finished in
+        # between is never left behind in the results queue.
+        with self._render_lock:
+            pending = bool(self._render_pending)
+        updated = False
+        while True:
+            try:
+                key, tile = self._render_results.get_nowait()
+            except queue.Empty:
+                break
+            self._render_cache[key] = tile
+            updated = True
+        # Evict least recently drawn tiles beyond the cache limit.
+        while len(self._render_cache) > self.max_cached_tiles:
+            _, tile = self._render_cache.popitem(last=False)
+            if tile is not None:
+                hide_tile(canvas, tile)
+        if pending:
+            self._poll_id = canvas.after(RENDER_POLL_MS, self._poll_rendered_tiles, canvas)
+        if updated:
+            canvas.event_generate("<<LayerUpdated>>")
+
+    def close(self):
+        """
+        Stop the render thread and release the rendered tiles.
+        """
+        if self._render_thread is not None:
+            # Jobs still queued are skipped as their level no longer matches,
+            # then the thread exits on the stop marker.
+            self._render_level = None
+            self._render_jobs.put(None)
+            self._render_thread = None
+            self._render_jobs = queue.Queue()
+        with self._render_lock:
+            self._render_pending.clear()
+        if self._canvas is not None:
+            if self._poll_id is not None:
+                self._canvas.after_cancel(self._poll_id)
+            self._hide_rendered_tiles(self._canvas)
+        self._poll_id = None
+        self._canvas = None
+        self._render_cache.clear()
+
+    def _render_worker(self):
+        # Keep the queue this thread was started with; close() replaces it.
+        jobs = self._render_jobs
+        # Indexing visits every feature, so it is done here rather than on the
+        # UI thread the first time the layer is drawn.
+        try:
+            self._ensure_spatial_index()
+        except Exception as e:
+            print(f"Warning: Failed to index {self.geojson_file}: {e}")
+        while True:
+            key = jobs.get()
+            if key is None:
+                return
+            level, tile_x, tile_z = key
+            try:
+                # Skip tiles requested at a zoom level the view has since left.
+                if level == self._render_level:
+                    tile = None
+                    try:
+                        tile = self._render_tile(level, tile_x, tile_z)
+                    except Exception as e:
+                        # Cache the tile as empty so it is not requested again.
+                        print(f"Warning: Failed to render tile {key} of {self.geojson_file}: {e}")
+                    self._render_results.put((key, tile))
+            finally:
+                with self._render_lock:
+                    self._render_pending.discard(key)
+
+    def _render_tile(self, level, tile_x, tile_z):
+        scale = 2.0 ** level
+        world_size = RENDER_TILE_SIZE / scale
+        origin_x = tile_x * world_size
+        origin_z = tile_z * world_size
+        # Include features just outside the tile whose point markers or line
+        # widths reach into it.
+        margin = POINT_RADIUS / scale
+        indexes = self.query_features(origin_x - margin, origin_z - margin,
+                                      origin_x + world_size + margin, origin_z + world_size + margin)
+        if not indexes:
+            return None
+
+        image = Image.new("RGBA", (RENDER_TILE_SIZE, RENDER_TILE_SIZE), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+
+        def to_pixels(points):
+            # Positions may carry an altitude; only the first two values are used.
+            return [((point[0] - origin_x) * scale, (point[1] - origin_z) * scale) for point in points]
+
+        def draw_point(point):
+            px, pz = to_pixels([point])[0]
+            draw.ellipse((px - POINT_RADIUS, pz - POINT_RADIUS, px + POINT_RADIUS, pz + POINT_RADIUS),
+                         fill='red', outline='black')
+
+        def draw_polygon(rings):
+            for ring in rings:
+                pixels = to_pixels(ring)
+                if pixels:
+                    draw.line(pixels + pixels[:1], fill='green', width=2)
+
+        features = self.geojson_data.get('features', [])
+        for index in indexes:
+            geometry = features[index].get('geometry') or {}
+            geometry_type = geometry.get('type')
+            coordinates = geometry.get('coordinates', [])
+            if geometry_type == 'Point':
+                draw_point(coordinates)
+            elif geometry_type == 'LineString':
+                draw.line(to_pixels(coordinates), fill='blue', width=2)
+            elif geometry_type == 'Polygon':
+                draw_polygon(coordinates)
+            elif geometry_type == 'MultiPoint':
+                for point in coordinates:
+                    draw_point(point)
+            elif geometry_type == 'MultiLineString':
+                for line in coordinates:
+                    draw.line(to_pixels(line), fill='blue', width=2)
+            elif geometry_type == 'MultiPolygon':
+                for polygon in coordinates:
+                    draw_polygon(polygon)
+
+        return RenderedTile(image, origin_x, origin_z, world_size)
+
+def _coordinate_bounds(coordinates):
+    """
+    Return (min_x, min_z, max_x, max_z) over a nested GeoJSON coordinate list,
+    or None if it holds no positions.
+    """
+    if not isinstance(coordinates, (list, tuple)) or not coordinates:
+        return None
+    if isinstance(coordinates[0], (int, float)):
+        if len(coordinates) < 2:
+            return None
+        x, z = coordinates[0], coordinates[1]
+        return (x, z, x, z)
+    bounds = None
+    for part in coordinates:
+        part_bounds = _coordinate_bounds(part)
+        if part_bounds is None:
+            continue
+        if bounds is None:
+            bounds = part_bounds
+        else:
+            bounds = (min(bounds[0], part_bounds[0]), min(bounds[1], part_bounds[1]),
+                      max(bounds[2], part_bounds[2]), max(bounds[3], part_bounds[3]))
+    return bounds
@@ -46,7 +46,7 @@ class LayerListDialog(tk.Toplevel):
     
     def add_layer(self):
         # Create a dialog to choose layer type
-        layer_type = simpledialog.askstring("Layer Type", "Enter layer type (tile/geojson):", initialvalue="tile")
+        layer_type = simpledialog.askstring("Layer Type", "Enter layer type (tile/container/geojson):", initialvalue="tile")
         
         if layer_type and layer_type.lower() == "tile":
             tile_folder = filedialog.askdirectory(title="Select Tile Folder")
@@ -62,6 +62,28 @@ class LayerListDialog(tk.Toplevel):
                     if hasattr(layer, 'calculate_bounds'):
                         layer.calculate_bounds()
                     self.refresh_list()
+        elif layer_type and layer_type.lower() == "container":
+            container_file = filedialog.askopenfilename(
+                title="Select Tile Container",
+                filetypes=[("Tile Container", "*.mbtiles"), ("All Files", "*.*")]
+            )
+            if container_file:
+                layer_name = simpledialog.askstring("Layer Name", "Enter a name for this layer:", 
+                                                  initialvalue="Raster Layer")
+                if layer_name:
+                    import tile_container
+                    layer = tile_container.TileContainerLayer(container_file, name=layer_name, project=self.project)
+                    # Load before adding, so a file that is not a tile container
+                    # leaves the project untouched.
+                    try:
+                        layer.load_tiles()
+                    except Exception as e:
+                        layer.close()
+                        messagebox.showerror("Error", f"Failed to load tile container: {str(e)}")
+                        return
+                    self.project.add_layer(layer)
+                    layer.calculate_bounds()
+                    self.refresh_list()
         elif layer_type and layer_type.lower() == "geojson":
             geojson_file = filedialog.askopenfilename(
                 title="Select GeoJSON File",
@@ -71,8 +93,9 @@ class LayerListDialog(tk.Toplevel):
                 layer_name = simpledialog.askstring("Layer Name", "Enter a name for this layer:", 
                                                   initialvalue="GeoJSON Layer")
                 if layer_name:
+                    rasterize = messagebox.askyesno("Render Mode", "Rasterize this layer? Recommended for layers with many features.")
                     from geojson_layer import GeoJSONLayer
-                    layer = GeoJSONLayer(geojson_file, name=layer_name, project=self.project)
+                    layer = GeoJSONLayer(geojson_file, name=layer_name, project=self.project, rasterize=rasterize)
                     self.project.add_layer(layer)
                     self.refresh_list()
     
@@ -102,6 +125,7 @@ class LayerListDialog(tk.Toplevel):
         if messagebox.askyesno("Confirm Deletion", "Are you sure you want to remove this layer?"):
             layer = self.project.layers[index]
             self.project.remove_layer(layer)
+            layer.close()
             self.refresh_list()
     
     def move_up(self):
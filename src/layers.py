@@ -17,3 +17,10 @@ class Layer:
         Subclasses can implement this method.
         """
         pass
+
+    def close(self):
+        """
+        Release any resources held by the layer, such as open files.
+        Subclasses can implement this method.
+        """
+        pass
@@ -2,11 +2,23 @@ import tkinter as tk
 from tkinter import filedialog, simpledialog, messagebox
 import json
 import tiles  # For RasterTileSource type checking
+import tile_container
+import project_bundle
 from project import Project
 from layer_editor import LayerListDialog
+from prefetch import TilePrefetcher
 from geojson_layer import GeoJSONLayer
 from utils.pos_transformer import minecraft_to_wgs84_via_proj
 
+# Zoom factors applied per mouse wheel step, and the allowed zoom range.
+ZOOM_IN_STEP = 1.1
+ZOOM_OUT_STEP = 0.9
+MIN_ZOOM = 0.1
+MAX_ZOOM = 8.0
+# Limits for warming tiles ahead of pans and zooms.
+PREFETCH_MEMORY_BUDGET = 64 * 1024 * 1024
+PREFETCH_TIME_BUDGET_MS = 8
+
 class ProjectManager:
     def __init__(self):
         self.current_project = None
@@ -21,10 +33,18 @@ class ProjectManager:
         if not path:
             path = filedialog.asksaveasfilename(
                 defaultextension=".mcgis",
-                filetypes=[("MCGIS Project", "*.mcgis"), ("All Files", "*.*")]
+                filetypes=[
+                    ("MCGIS Project", "*.mcgis"),
+                    ("MCGIS Bundled Project", "*" + project_bundle.BUNDLE_EXTENSION),
+                    ("All Files", "*.*")
+                ]
             )
         if not path:
             return False
+
+        # Bundled projects also store layer indexes so they open without
+        # rescanning or reparsing layer sources.
+        bundled = path.endswith(project_bundle.BUNDLE_EXTENSION)
         
         project_data = {
             "name": project.name,
@@ -33,57 +53,101 @@ class ProjectManager:
             "offset_y": project.offset_y,
             "layers": []
         }
+        if bundled:
+            project_data["bounds"] = [project.min_x, project.min_z,
+                                      project.world_width, project.world_height]
         
         for layer in project.layers:
-            if isinstance(layer, tiles.RasterTileSource):
+            layer_data = None
+            # TileContainerLayer is a RasterTileSource, so it must be checked first.
+            if isinstance(layer, tile_container.TileContainerLayer):
+                layer_data = {
+                    "type": "TileContainerLayer",
+                    "name": layer.name,
+                    "container_file": layer.container_file
+                }
+            elif isinstance(layer, tiles.RasterTileSource):
                 layer_data = {
                     "type": "RasterTileSource",
                     "name": layer.name,
                     "tile_folder": layer.tile_folder
                 }
-                project_data["layers"].append(layer_data)
             elif isinstance(layer, GeoJSONLayer):
                 layer_data = {
                     "type": "GeoJSONLayer",
                     "name": layer.name,
-                    "geojson_file": layer.geojson_file
+                    "geojson_file": layer.geojson_file,
+                    "rasterize": layer.rasterize
                 }
+            if layer_data is not None:
+                if bundled:
+                    project_bundle.bundle_layer(layer, layer_data)
                 project_data["layers"].append(layer_data)
         
-        with open(path, 'w') as f:
-            json.dump(project_data, f, indent=2)
+        if bundled:
+            project_bundle.write_bundle(path, project_data)
+        else:
+            with open(path, 'w') as f:
+                json.dump(project_data, f, indent=2)
         
         return True
     
     def load_project(self, path=None):
         if not path:
             path = filedialog.askopenfilename(
-                filetypes=[("MCGIS Project", "*.mcgis"), ("All Files", "*.*")]
+                filetypes=[
+                    ("MCGIS Project", "*.mcgis *" + project_bundle.BUNDLE_EXTENSION),
+                    ("All Files", "*.*")
+                ]
             )
         if not path:
             return None
         
         try:
-            with open(path, 'r') as f:
-                project_data = json.load(f)
+            bundled = project_bundle.is_bundle(path)
+            if bundled:
+                project_data = project_bundle.read_bundle(path)
+            else:
+                with open(path, 'r') as f:
+                    project_data = json.load(f)
             
             project = Project(project_data["name"])
             project.zoom = project_data["zoom"]
             project.offset_x = project_data["offset_x"]
             project.offset_y = project_data["offset_y"]
+            if "bounds" in project_data:
+                project.min_x, project.min_z, project.world_width, project.world_height = project_data["bounds"]
             
             for layer_data in project_data["layers"]:
+                layer = None
+                lazy_load = False
                 if layer_data["type"] == "RasterTileSource":
                     layer = tiles.RasterTileSource(
                         layer_data["tile_folder"],
                         name=layer_data["name"]
                     )
-                    project.add_layer(layer)
+                elif layer_data["type"] == "TileContainerLayer":
+                    layer = tile_container.TileContainerLayer(
+                        layer_data["container_file"],
+                        name=layer_data["name"]
+                    )
                 elif layer_data["type"] == "GeoJSONLayer":
+                    # Bundles save the spatial index of rasterized layers, so parsing
+                    # is deferred to the render thread.
+                    lazy_load = bundled and layer_data.get("rasterize", False)
                     layer = GeoJSONLayer(
                         layer_data["geojson_file"],
-                        name=layer_data["name"]
+                        name=layer_data["name"],
+                        rasterize=layer_data.get("rasterize", False),
+                        lazy_load=lazy_load
                     )
+                if layer is not None:
+                    restored = bundled and project_bundle.restore_layer(layer, layer_data)
+                    if lazy_load and not restored:
+                        # Without a current index there is nothing to gain from
+                        # deferring, and a missing file is reported here as it
+                        # is for .mcgis projects.
+                        layer.load_geojson()
                     project.add_layer(layer)
             
             return project
@@ -99,6 +163,10 @@ class MapViewer(tk.Frame):
         self.project_manager = ProjectManager()
 
         self.drag_start = None
+        # Most recent pan movement and wheel zoom step, used to predict what
+        # the next redraw will need.
+        self.pan_direction = (0, 0)
+        self.last_zoom_step = ZOOM_IN_STEP
 
         # Create menu
         self.menu_bar = tk.Menu(master)
@@ -119,7 +187,9 @@ class MapViewer(tk.Frame):
         self.menu_bar.add_cascade(label="Project", menu=project_menu)
         project_menu.add_command(label="Properties", command=self.edit_project_properties)
         project_menu.add_command(label="Add Tile Layer", command=self.add_tile_layer)
+        project_menu.add_command(label="Add Tile Container Layer", command=self.add_tile_container_layer)
         project_menu.add_command(label="Add GeoJSON Layer", command=self.add_geojson_layer)
+        project_menu.add_command(label="Convert Tile Folder", command=self.convert_tile_folder)
         project_menu.add_command(label="Manage Layers", command=self.manage_layers)
         
         # Set up the canvas and UI elements
@@ -138,11 +208,18 @@ class MapViewer(tk.Frame):
         self.vbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.coord_label.pack(side=tk.BOTTOM, fill=tk.X)
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.prefetcher = TilePrefetcher(
+            self.canvas,
+            memory_budget=PREFETCH_MEMORY_BUDGET,
+            time_budget_ms=PREFETCH_TIME_BUDGET_MS
+        )
 
         self.canvas.bind("<ButtonPress-2>", self.start_pan)
         self.canvas.bind("<B2-Motion>", self.do_pan)
         self.canvas.bind("<MouseWheel>", self.zoom_handler)
         self.canvas.bind("<Motion>", self.update_cursor_position)
+        # Raised by layers when background work (e.g. tile rendering) completes.
+        self.canvas.bind("<<LayerUpdated>>", lambda e: self.redraw())
         self.bind("<Configure>", lambda e: self.redraw())
 
         # Initialize with empty project if none provided
@@ -160,12 +237,16 @@ class MapViewer(tk.Frame):
     def new_project(self):
         project = self.project_manager.new_project()
         if project:
+            self.prefetcher.clear()
+            self.project.close()
             self.project = project
             self.redraw()
     
     def open_project(self):
         project = self.project_manager.load_project()
         if project:
+            self.prefetcher.clear()
+            self.project.close()
             self.project = project
             # Initialize layers
             for layer in self.project.layers:
@@ -195,8 +276,9 @@ class MapViewer(tk.Frame):
         if geojson_file:
             layer_name = simpledialog.askstring("Layer Name", "Enter a name for this layer:", initialvalue="GeoJSON Layer")
             if layer_name:
+                rasterize = messagebox.askyesno("Render Mode", "Rasterize this layer? Recommended for layers with many features.")
                 from geojson_layer import GeoJSONLayer
-                layer = GeoJSONLayer(geojson_file, name=layer_name, project=self.project)
+                layer = GeoJSONLayer(geojson_file, name=layer_name, project=self.project, rasterize=rasterize)
                 self.project.add_layer(layer)
                 self.redraw()
 
@@ -213,6 +295,45 @@ class MapViewer(tk.Frame):
                     layer.calculate_bounds()
                 self.redraw()
 
+    def add_tile_container_layer(self):
+        container_file = filedialog.askopenfilename(
+            title="Select Tile Container",
+            filetypes=[("Tile Container", "*.mbtiles"), ("All Files", "*.*")]
+        )
+        if container_file:
+            layer_name = simpledialog.askstring("Layer Name", "Enter a name for this layer:", initialvalue="Raster Layer")
+            if layer_name:
+                layer = tile_container.TileContainerLayer(container_file, name=layer_name, project=self.project)
+                # Load before adding, so a file that is not a tile container
+                # leaves the project untouched.
+                try:
+                    layer.load_tiles()
+                except Exception as e:
+                    layer.close()
+                    messagebox.showerror("Error", f"Failed to load tile container: {str(e)}")
+                    return
+                self.project.add_layer(layer)
+                layer.calculate_bounds()
+                self.redraw()
+
+    def convert_tile_folder(self):
+        tile_folder = filedialog.askdirectory(title="Select Tile Folder")
+        if not tile_folder:
+            return
+        container_file = filedialog.asksaveasfilename(
+            title="Save Tile Container",
+            defaultextension=".mbtiles",
+            filetypes=[("Tile Container", "*.mbtiles"), ("All Files", "*.*")]
+        )
+        if not container_file:
+            return
+        try:
+            count = tile_container.convert_tile_folder(tile_folder, container_file)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to convert tile folder: {str(e)}")
+            return
+        messagebox.showinfo("Convert Tile Folder", f"Wrote {count} tiles to {container_file}")
+
     def manage_layers(self):
         dialog = LayerListDialog(self.master, self.project)
         self.master.wait_window(dialog)
@@ -236,6 +357,14 @@ class MapViewer(tk.Frame):
         # Delegate drawing to the project, which passes the current zoom and pan to its layers.
         self.project.draw(self.canvas, view_left, view_top, view_right, view_bottom)
         self.update_scroll_region()
+        # Warm tiles for the next pan or zoom in idle time, trying the last
+        # zoom direction first.
+        other_step = ZOOM_OUT_STEP if self.last_zoom_step == ZOOM_IN_STEP else ZOOM_IN_STEP
+        self.prefetcher.schedule(
+            self.project, view_left, view_top, view_right, view_bottom,
+            pan_direction=self.pan_direction,
+            next_zooms=[self.next_zoom(self.last_zoom_step), self.next_zoom(other_step)]
+        )
         # For the window title, locate a RasterTileSource layer if present.
         title = f"{self.project.name} - MCGIS"
         title = f"Zoom ({self.project.zoom:.2f}) - {title}"
@@ -270,12 +399,17 @@ class MapViewer(tk.Frame):
             self.project.offset_x += dx
             self.project.offset_y += dy
             self.drag_start = (event.x, event.y)
+            if dx or dy:
+                self.pan_direction = (dx, dy)
             self.redraw()
 
+    def next_zoom(self, step):
+        return max(MIN_ZOOM, min(MAX_ZOOM, self.project.zoom * step))
+
     def zoom_handler(self, event):
         old_zoom = self.project.zoom
-        new_zoom = self.project.zoom * (1.1 if event.delta > 0 else 0.9)
-        new_zoom = max(0.1, min(8.0, new_zoom))
+        self.last_zoom_step = ZOOM_IN_STEP if event.delta > 0 else ZOOM_OUT_STEP
+        new_zoom = self.next_zoom(self.last_zoom_step)
 
         # Calculate mouse position in canvas coordinates.
         cx = self.canvas.canvasx(event.x)
@@ -0,0 +1,218 @@
+# prefetch.py
+
+import math
+import time
+from collections import OrderedDict
+from tiles import RasterTileSource
+
+# Number of tiles the planner checks between deadline checks.
+PLAN_BATCH = 256
+# Marks the end of the work generator.
+_DONE = object()
+
+class TilePrefetcher:
+    """
+    Warms tile images during idle time so tiles exposed by the next pan or
+    wheel zoom are ready to draw.
+
+    Two kinds of work are done, in this order:
+      - the ring of tiles just outside the viewport gets its Tk image built at
+        the current zoom, starting on the side the view is moving towards;
+      - tiles that would be visible at the predicted next zoom levels get
+        their scaled image prepared (see Tile.prefetch).
+
+    Work runs in slices of at most time_budget_ms, one slice per idle period
+    after slice_interval_ms. Warmed images are tracked in least recently used
+    order and released once they exceed memory_budget bytes.
+    """
+    def __init__(self, canvas, memory_budget=64 * 1024 * 1024, time_budget_ms=8,
+                 slice_interval_ms=15, ring_margin=256):
+        self.canvas = canvas
+        self.memory_budget = memory_budget
+        self.time_budget_ms = time_budget_ms
+        self.slice_interval_ms = slice_interval_ms
+        self.ring_margin = ring_margin
+        # (tile, kind, size) -> (bytes used, whether the source image was decoded for it)
+        self.entries = OrderedDict()
+        self.memory_used = 0
+        self._request = None
+        self._work = None
+        self._pass_keys = set()  # Entries warmed for the current view
+        self._after_id = None
+
+    def schedule(self, project, view_left, view_top, view_right, view_bottom,
+                 pan_direction=(0, 0), next_zooms=()):
+        """
+        Replace any outstanding work with prefetching for the given view.
+        pan_direction is the most recent pan movement of the map in canvas
+        pixels; next_zooms lists the likely next zoom values, most likely first.
+        """
+        self._request = (project, (view_left, view_top, view_right, view_bottom),
+                         pan_direction, next_zooms)
+        self._work = None
+        self._pass_keys = set()
+        self._cancel()
+        self._after_id = self.canvas.after_idle(self._run)
+
+    def clear(self):
+        """
+        Cancel outstanding work and release every warmed image.
+        """
+        self._cancel()
+        self._finish()
+        self._pass_keys = set()
+        while self.entries:
+            self._evict()
+
+    def _cancel(self):
+        if self._after_id is not None:
+            self.canvas.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _run(self):
+        self._after_id = None
+        deadline = time.perf_counter() + self.time_budget_ms / 1000.0
+        if self._work is None:
+            if self._request is None:
+                return
+            self._work = self._plan(*self._request)
+        # Planning is done by the same generator, so it also counts against
+        # the slice budget. Each slice takes at least one step, so a very small
+        # budget still makes progress.
+        while True:
+            item = next(self._work, _DONE)
+            if item is _DONE:
+                self._finish()
+                return
+            if item is not None:
+                layer, kind, tile, zoom = item
+                # Skip layers removed since planning; their sources may be closed.
+                if layer in self._request[0].layers and not self._do(kind, tile, zoom):
+                    # Out of memory budget for this view; stop until the next one.
+                    self._finish()
+                    return
+            if time.perf_counter() >= deadline:
+                break
+        self._after_id = self.canvas.after(self.slice_interval_ms, self._next_slice)
+
+    def _next_slice(self):
+        self._after_id = self.canvas.after_idle(self._run)
+
+    def _finish(self):
+        self._request = None
+        self._work = None
+
+    def _plan(self, project, view, pan_direction, next_zooms):
+        """
+        Generate the work for a view in priority order. Tiles are scanned in a
+        single pass that yields None every PLAN_BATCH tiles, so the caller
+        can stop at its deadline and resume in a later slice.
+        """
+        view_left, view_top, view_right, view_bottom = view
+        zoom = project.zoom
+        layers = [layer for layer in project.layers if isinstance(layer, RasterTileSource)]
+
+        # The map moves with the drag, so new tiles come in from the opposite side.
+        dx, dy = -pan_direction[0], -pan_direction[1]
+        length = math.hypot(dx, dy)
+        if length:
+            dx, dy = dx / length, dy / length
+        margin = self.ring_margin
+        ring = (
+            view_left - margin - max(0, -dx) * margin,
+            view_top - margin - max(0, -dy) * margin,
+            view_right + margin + max(0, dx) * margin,
+            view_bottom + margin + max(0, dy) * margin,
+        )
+        centre_x = (view_left + view_right) / 2
+        centre_y = (view_top + view_bottom) / 2
+
+        # The wheel zooms about the cursor, so the next view can extend up to
+        # the full change in size on any side of the current one.
+        extents = []
+        for next_zoom in next_zooms:
+            if next_zoom == zoom:
+                continue
+            grow = max(0.0, zoom / next_zoom - 1)
+            extents.append((next_zoom, (
+                view_left - (view_right - view_left) * grow,
+                view_top - (view_bottom - view_top) * grow,
+                view_right + (view_right - view_left) * grow,
+                view_bottom + (view_bottom - view_top) * grow,
+            ), []))
+
+        ring_work = []
+        scanned = 0
+        for layer in layers:
+            for tile in layer.tiles:
+                scanned += 1
+                if scanned % PLAN_BATCH == 0:
+                    yield None
+                bounds = layer.tile_canvas_bounds(tile, zoom, project.offset_x, project.offset_y)
+                for next_zoom, extent, scale_work in extents:
+                    if _overlaps(bounds, extent):
+                        scale_work.append((layer, "scale", tile, next_zoom))
+                if _overlaps(bounds, view) or not _overlaps(bounds, ring):
+                    continue
+                x1, y1, x2, y2 = bounds
+                gap = max(view_left - x2, x1 - view_right, view_top - y2, y1 - view_bottom, 0)
+                ahead = ((x1 + x2) / 2 - centre_x) * dx + ((y1 + y2) / 2 - centre_y) * dy > 0
+                ring_work.append(((not ahead, gap), (layer, "ring", tile, zoom)))
+
+        ring_work.sort(key=lambda item: item[0])
+        for _, item in ring_work:
+            yield item
+        for _, _, scale_work in extents:
+            yield from scale_work
+
+    def _do(self, kind, tile, zoom):
+        """
+        Warm one tile. Returns False once the memory budget has been used up
+        by work for the current view.
+        """
+        size = tile.scaled_size(zoom)
+        key = (tile, kind, size)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self._pass_keys.add(key)
+            return True
+        used = size[0] * size[1] * 4
+        # Scaling decodes the full-size source image first, so count it too
+        # when it is not already in memory.
+        decoded = tile._image is None
+        if decoded:
+            used += tile.width * tile.height * 4
+        if used > self.memory_budget:
+            return True
+        while self.memory_used + used > self.memory_budget:
+            # Entries warmed for the current view are only evicted by a later one.
+            if next(iter(self.entries)) in self._pass_keys:
+                return False
+            self._evict()
+
+        if kind == "ring":
+            tile.update_image(zoom)
+        else:
+            tile.prefetch(zoom)
+        self.entries[key] = (used, decoded)
+        self.memory_used += used
+        self._pass_keys.add(key)
+        return True
+
+    def _evict(self):
+        (tile, kind, size), (used, decoded) = self.entries.popitem(last=False)
+        self.memory_used -= used
+        if decoded and tile.canvas_id is None:
+            # Release the source image decoded for this entry unless the tile
+            # has since been drawn.
+            tile._image = None
+        if kind == "ring":
+            # Only drop the Tk image if it was not since put on the canvas.
+            if tile.canvas_id is None and tile.tk_image is not None and tile.scaled_size(tile.last_zoom) == size:
+                tile.tk_image = None
+                tile.last_zoom = None
+        else:
+            tile.prefetched.pop(size, None)
+
+def _overlaps(a, b):
+    return a[0] < b[2] and a[2] > b[0] and a[1] < b[3] and a[3] > b[1]
@@ -33,3 +33,10 @@ class Project:
         """
         for layer in self.layers:
             layer.update()
+
+    def close(self):
+        """
+        Delegate close to each layer.
+        """
+        for layer in self.layers:
+            layer.close()
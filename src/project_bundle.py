@@ -0,0 +1,98 @@
+# project_bundle.py
+
+import json
+import struct
+import zlib
+import tiles
+import tile_container
+from geojson_layer import GeoJSONLayer
+from utils.files import source_mtime
+
+# A bundle is a fixed header followed by zlib-compressed JSON holding the same
+# project data as a .mcgis file, plus a precomputed index for each layer.
+BUNDLE_MAGIC = b"MCGISB"
+BUNDLE_VERSION = 1
+HEADER = struct.Struct(">6sH")
+BUNDLE_EXTENSION = ".mcgisb"
+
+def is_bundle(path):
+    with open(path, 'rb') as f:
+        return f.read(len(BUNDLE_MAGIC)) == BUNDLE_MAGIC
+
+def write_bundle(path, project_data):
+    payload = zlib.compress(json.dumps(project_data, separators=(',', ':')).encode('utf-8'))
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION))
+        f.write(payload)
+
+def read_bundle(path):
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        payload = f.read()
+    if len(header) < HEADER.size:
+        raise ValueError("Not an MCGIS project bundle")
+    magic, version = HEADER.unpack(header)
+    if magic != BUNDLE_MAGIC:
+        raise ValueError("Not an MCGIS project bundle")
+    if version != BUNDLE_VERSION:
+        raise ValueError(f"Unsupported project bundle version {version}")
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+def source_path(layer):
+    """
+    Return the file or folder a layer's derived state is built from.
+    """
+    if isinstance(layer, tile_container.TileContainerLayer):
+        return layer.container_file
+    if isinstance(layer, tiles.RasterTileSource):
+        return layer.tile_folder
+    if isinstance(layer, GeoJSONLayer):
+        return layer.geojson_file
+    return None
+
+def bundle_layer(layer, layer_data):
+    """
+    Add the source modification time and precomputed index of a layer to its
+    saved definition. The time is the one the layer recorded when it read its
+    source, so an index is never paired with a newer source than it describes.
+    """
+    layer_data["source_mtime"] = layer.source_mtime
+    if layer.source_mtime is None:
+        return layer_data
+    if isinstance(layer, tiles.RasterTileSource):
+        layer_data["index"] = {"tiles": layer.tile_manifest()}
+    elif isinstance(layer, GeoJSONLayer) and layer.rasterize:
+        # Only rasterized layers look features up through the spatial index;
+        # vector layers draw every feature and have no use for it.
+        # Goes through the layer's lock, so a save made while the render thread
+        # is indexing waits for that index instead of building a second one.
+        layer._ensure_spatial_index()
+        layer_data["index"] = {
+            "feature_bounds": layer.feature_bounds,
+            "cells": [[cell_x, cell_z, indexes]
+                      for (cell_x, cell_z), indexes in layer.spatial_index.items()]
+        }
+    return layer_data
+
+def restore_layer(layer, layer_data):
+    """
+    Apply the index saved with a layer if its source has not changed since.
+    Returns True if the index was used; otherwise the layer rebuilds its state
+    from the source as usual.
+    """
+    index = layer_data.get("index")
+    mtime = layer_data.get("source_mtime")
+    if index is None or mtime is None or mtime != source_mtime(source_path(layer)):
+        return False
+    if isinstance(layer, tiles.RasterTileSource):
+        layer.manifest = index["tiles"]
+        layer.source_mtime = mtime
+    elif isinstance(layer, GeoJSONLayer) and layer.rasterize:
+        layer.feature_bounds = [tuple(bounds) if bounds is not None else None
+                                for bounds in index["feature_bounds"]]
+        layer.spatial_index = {(cell_x, cell_z): indexes
+                               for cell_x, cell_z, indexes in index["cells"]}
+        layer.source_mtime = mtime
+    else:
+        return False
+    return True
@@ -0,0 +1,183 @@
+# tile_container.py
+
+import io
+import os
+import pathlib
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from PIL import Image
+from tiles import TILE_PATTERN, Tile, RasterTileSource
+from utils.files import source_mtime
+
+# MBTiles-style schema. The standard zoom_level/tile_column/tile_row columns
+# hold the tile coordinates; the game coordinates and pixel size of each tile
+# are stored alongside so that the layer can be built without decoding images.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tiles (
+    zoom_level INTEGER NOT NULL,
+    tile_column INTEGER NOT NULL,
+    tile_row INTEGER NOT NULL,
+    game_x INTEGER NOT NULL,
+    game_z INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    tile_data BLOB NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row);
+"""
+
+class ConnectionPool:
+    """
+    A fixed-size pool of read-only SQLite connections.
+    Connections may be borrowed from any thread, so background decode threads
+    can read tiles alongside the UI thread.
+    """
+    def __init__(self, path, size=4):
+        self.path = path
+        self.size = size
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+
+    def _open(self):
+        # as_uri escapes characters such as '#', '?' and '%' and handles drive letters.
+        uri = pathlib.Path(self.path).resolve().as_uri() + "?mode=ro"
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with-block. New connections are
+        opened on demand until the pool is full, after which callers wait for one
+        to be returned.
+        """
+        connection = None
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+            if self._idle.empty() and self._opened < self.size:
+                connection = self._open()
+                self._opened += 1
+        if connection is None:
+            connection = self._idle.get()
+            if connection is None:
+                # The pool was closed while waiting; pass the marker on to any
+                # other waiting callers.
+                self._idle.put(None)
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+        try:
+            yield connection
+        finally:
+            with self._lock:
+                if self._closed:
+                    connection.close()
+                else:
+                    self._idle.put(connection)
+
+    def close(self):
+        """
+        Close the idle connections. Connections still borrowed are closed
+        when they are returned.
+        """
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if connection is not None:
+                    connection.close()
+            # Wake any caller waiting for a connection.
+            self._idle.put(None)
+
+class ContainerTile(Tile):
+    def __init__(self, pool, tile_x, tile_z, game_x, game_z, width, height):
+        self.pool = pool
+        super().__init__(None, tile_x, tile_z, game_x, game_z, width, height)
+
+    def load_image(self):
+        with self.pool.connection() as connection:
+            row = connection.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = 0 AND tile_column = ? AND tile_row = ?",
+                (self.tile_x, self.tile_z)
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"Tile {self.tile_x}, {self.tile_z} missing from container")
+        image = Image.open(io.BytesIO(row[0]))
+        # Decode now, while the blob is in memory, rather than on first resize.
+        image.load()
+        return image
+
+class TileContainerLayer(RasterTileSource):
+    """
+    A raster layer whose tiles are stored in a single SQLite container file
+    (see convert_tile_folder) instead of a folder of loose PNGs.
+    """
+    def __init__(self, container_file, name="Tile Container Layer", project=None, pool_size=4):
+        super().__init__(None, name, project)
+        self.container_file = container_file
+        self.pool = ConnectionPool(container_file, size=pool_size)
+
+    def load_tiles(self):
+        self.tiles = []
+        if self.manifest is not None:
+            for _, tile_x, tile_z, game_x, game_z, width, height in self.manifest:
+                self.tiles.append(ContainerTile(self.pool, tile_x, tile_z, game_x, game_z, width, height))
+            self.manifest = None
+            return
+        self.source_mtime = source_mtime(self.container_file)
+        with self.pool.connection() as connection:
+            rows = connection.execute(
+                "SELECT tile_column, tile_row, game_x, game_z, width, height "
+                "FROM tiles WHERE zoom_level = 0"
+            ).fetchall()
+        for tile_x, tile_z, game_x, game_z, width, height in rows:
+            self.tiles.append(ContainerTile(self.pool, tile_x, tile_z, game_x, game_z, width, height))
+
+    def close(self):
+        self.pool.close()
+
+def convert_tile_folder(tile_folder, container_file):
+    """
+    Pack every tile in tile_folder that matches TILE_PATTERN into a container
+    file. Existing tiles with the same coordinates are replaced.
+    Returns the number of tiles written.
+    """
+    count = 0
+    connection = sqlite3.connect(container_file)
+    try:
+        connection.executescript(SCHEMA)
+        connection.execute(
+            "INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)",
+            ("name", os.path.basename(os.path.normpath(tile_folder)))
+        )
+        connection.execute(
+            "INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)",
+            ("format", "png")
+        )
+        for fname in os.listdir(tile_folder):
+            match = TILE_PATTERN.match(fname)
+            if not match:
+                continue
+            tile_x, tile_z, game_x, game_z = (int(value) for value in match.groups())
+            path = os.path.join(tile_folder, fname)
+            with open(path, 'rb') as f:
+                data = f.read()
+            with Image.open(io.BytesIO(data)) as image:
+                width, height = image.size
+            connection.execute(
+                "INSERT OR REPLACE INTO tiles "
+                "(zoom_level, tile_column, tile_row, game_x, game_z, width, height, tile_data) "
+                "VALUES (0, ?, ?, ?, ?, ?, ?, ?)",
+                (tile_x, tile_z, game_x, game_z, width, height, sqlite3.Binary(data))
+            )
+            count += 1
+        connection.commit()
+    finally:
+        connection.close()
+    return count
@@ -4,20 +4,42 @@ import re
 import os
 from PIL import Image, ImageTk
 from layers import Layer
+from utils.files import source_mtime
 
 TILE_PATTERN = re.compile(r'^(\d+)_(\d+)_x(-?\d+)_z(-?\d+)\.png$')
 
 class Tile:
-    def __init__(self, path, tile_x, tile_z, game_x, game_z):
+    def __init__(self, path, tile_x, tile_z, game_x, game_z, width=None, height=None):
         self.path = path
         self.tile_x = int(tile_x)
         self.tile_z = int(tile_z)
         self.game_x = int(game_x)
         self.game_z = int(game_z)
-        self.image = Image.open(path)
+        self._image = None
         self.tk_image = None
         self.canvas_id = None
         self.last_zoom = None  # Last zoom factor used to generate tk_image
+        self.prefetched = {}  # Scaled images warmed ahead of use, keyed by size
+        # When the size is not known up front, open the image to read its header.
+        if width is None or height is None:
+            width, height = self.image.size
+        self.width = int(width)
+        self.height = int(height)
+
+    @property
+    def image(self):
+        # Images are opened on first use so that tiles with a known size can be
+        # created without touching the underlying file.
+        if self._image is None:
+            self._image = self.load_image()
+        return self._image
+
+    def load_image(self):
+        """
+        Open the source image for this tile.
+        Subclasses can override this to read tiles from other storage.
+        """
+        return Image.open(self.path)
 
     def update_image(self, zoom):
         # Only update if no cached image exists or if the zoom has changed
@@ -27,16 +49,82 @@ class Tile:
             if change < 0.05 and self.tk_image is not None:
                 return
         self.last_zoom = zoom
-        new_size = (int(self.image.width * zoom), int(self.image.height * zoom))
-        self.tk_image = ImageTk.PhotoImage(self.image.resize(new_size, Image.NEAREST))
+        new_size = self.scaled_size(zoom)
+        scaled = self.prefetched.get(new_size)
+        if scaled is None:
+            scaled = self.image.resize(new_size, Image.NEAREST)
+        self.tk_image = ImageTk.PhotoImage(scaled)
+
+    def scaled_size(self, zoom):
+        return (int(self.width * zoom), int(self.height * zoom))
+
+    def prefetch(self, zoom):
+        """
+        Decode and scale the image for the given zoom ahead of time, so a later
+        update_image at that zoom only has to build the Tk image.
+        Returns the size of the scaled image.
+        """
+        size = self.scaled_size(zoom)
+        if size not in self.prefetched:
+            self.prefetched[size] = self.image.resize(size, Image.NEAREST)
+        return size
+
+def show_tile(canvas, tile, canvas_x, canvas_y, zoom):
+    """
+    Place a tile's image on the canvas at the given position, creating the
+    canvas item on first use.
+    """
+    tile.update_image(zoom)
+    if tile.canvas_id is None:
+        tile.canvas_id = canvas.create_image(
+            canvas_x, canvas_y, anchor="nw", image=tile.tk_image
+        )
+    else:
+        canvas.coords(tile.canvas_id, canvas_x, canvas_y)
+        canvas.itemconfig(tile.canvas_id, image=tile.tk_image)
+        # Kept items must be raised so stacking follows the layer draw order,
+        # as newly created items of earlier layers may otherwise cover them.
+        canvas.tag_raise(tile.canvas_id)
+
+def hide_tile(canvas, tile):
+    if tile.canvas_id is not None:
+        canvas.delete(tile.canvas_id)
+        tile.canvas_id = None
 
 class RasterTileSource(Layer):
     def __init__(self, tile_folder, name="Raster Tile Layer", project=None):
         super().__init__(name, project)
         self.tile_folder = tile_folder
         self.tiles = []
+        # Tile list saved with a project bundle; used once by load_tiles in
+        # place of scanning the folder.
+        self.manifest = None
+        # Modification time of the source when the tiles were loaded, so a
+        # saved manifest is never newer than the state it describes.
+        self.source_mtime = None
+
+    def tile_manifest(self):
+        """
+        Return the loaded tiles as a list of
+        [file name, tile_x, tile_z, game_x, game_z, width, height] entries.
+        """
+        return [
+            [os.path.basename(tile.path) if tile.path else None,
+             tile.tile_x, tile.tile_z, tile.game_x, tile.game_z, tile.width, tile.height]
+            for tile in self.tiles
+        ]
 
     def load_tiles(self):
+        self.tiles = []
+        if self.manifest is not None:
+            for fname, tile_x, tile_z, game_x, game_z, width, height in self.manifest:
+                path = os.path.join(self.tile_folder, fname)
+                self.tiles.append(Tile(path, tile_x, tile_z, game_x, game_z, width, height))
+            self.manifest = None
+            return
+        # Read before scanning, so changes made during the scan are caught on
+        # the next open.
+        self.source_mtime = source_mtime(self.tile_folder)
         for fname in os.listdir(self.tile_folder):
             match = TILE_PATTERN.match(fname)
             if match:
@@ -51,27 +139,33 @@ class RasterTileSource(Layer):
         if not self.tiles:
             return
         min_x = min(tile.game_x for tile in self.tiles)
-        max_x = max(tile.game_x + tile.image.width for tile in self.tiles)
+        max_x = max(tile.game_x + tile.width for tile in self.tiles)
         min_z = min(tile.game_z for tile in self.tiles)
-        max_z = max(tile.game_z + tile.image.height for tile in self.tiles)
+        max_z = max(tile.game_z + tile.height for tile in self.tiles)
         self.project.world_width = max_x - min_x
         self.project.world_height = max_z - min_z
         self.project.min_x = min_x
         self.project.min_z = min_z
 
+    def tile_canvas_bounds(self, tile, zoom, offset_x, offset_y):
+        """
+        Return the canvas rectangle (x1, y1, x2, y2) covered by a tile at the
+        given zoom and pan.
+        """
+        canvas_x1 = (tile.game_x - self.project.min_x) * zoom + offset_x
+        canvas_y1 = (tile.game_z - self.project.min_z) * zoom + offset_y
+        return (canvas_x1, canvas_y1,
+                canvas_x1 + tile.width * zoom, canvas_y1 + tile.height * zoom)
+
     def draw(self, canvas, view_left, view_top, view_right, view_bottom, zoom, offset_x, offset_y):
         """
         Draw each tile that falls within the visible region, using the project-level
         zoom and pan (offset) parameters.
         """
         for tile in self.tiles:
-            # Calculate canvas coordinates for the tile.
-            canvas_x1 = (tile.game_x - self.project.min_x) * zoom + offset_x
-            canvas_y1 = (tile.game_z - self.project.min_z) * zoom + offset_y
-            tile_width = tile.image.width * zoom
-            tile_height = tile.image.height * zoom
-            canvas_x2 = canvas_x1 + tile_width
-            canvas_y2 = canvas_y1 + tile_height
+            canvas_x1, canvas_y1, canvas_x2, canvas_y2 = self.tile_canvas_bounds(
+                tile, zoom, offset_x, offset_y
+            )
 
             is_visible = (
                 canvas_x1 < view_right and
@@ -81,18 +175,9 @@ class RasterTileSource(Layer):
             )
 
             if is_visible:
-                tile.update_image(zoom)
-                if tile.canvas_id is None:
-                    tile.canvas_id = canvas.create_image(
-                        canvas_x1, canvas_y1, anchor="nw", image=tile.tk_image
-                    )
-                else:
-                    canvas.coords(tile.canvas_id, canvas_x1, canvas_y1)
-                    canvas.itemconfig(tile.canvas_id, image=tile.tk_image)
+                show_tile(canvas, tile, canvas_x1, canvas_y1, zoom)
             else:
-                if tile.canvas_id is not None:
-                    canvas.delete(tile.canvas_id)
-                    tile.canvas_id = None
+                hide_tile(canvas, tile)
 
     def update(self):
         """
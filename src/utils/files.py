@@ -0,0 +1,11 @@
+import os
+
+def source_mtime(path):
+    """
+    Return the modification time of a layer source file or folder, or None if
+    it cannot be read.
+    """
+    try:
+        return os.path.getmtime(path)
+    except (OSError, TypeError):
+        return None